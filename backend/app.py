@@ -1,15 +1,25 @@
 import requests
 from flask import Flask, jsonify, request, send_file, g
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from collections import Counter, deque
+from contextlib import contextmanager
+from itertools import count
+import io
 import logging
 import os
+import sys
 from dotenv import load_dotenv
 from tiingo import TiingoClient
-from datetime import datetime, timedelta
-from threading import Lock
+from datetime import datetime, timedelta, timezone
+from threading import Event, Lock, Thread, get_ident
 import atexit
 from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from dateutil.easter import easter
+import math
+import numpy as np
+import pytz
 import time
 
 # Load API key
@@ -81,6 +91,131 @@ TICKER_NAMES = {
     "BMY": "Bristol-Myers Squibb Company"
 }
 
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+PROFILE_REQUESTS = os.getenv('PROFILE_REQUESTS') == '1'
+PROFILE_SCHEDULER = os.getenv('PROFILE_SCHEDULER') == '1'
+PROFILE_HISTORY = 50
+
+request_profiles = deque(maxlen=PROFILE_HISTORY)
+scheduler_profiles = deque(maxlen=PROFILE_HISTORY)
+span_stats = {}
+profile_ids = count(1)
+profile_lock = Lock()
+
+def _fold_stack(frame):
+    """Převede zásobník na řádek formátu folded stacks (kořen první, rámce oddělené středníkem)."""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(frames))
+
+class StackSampler:
+    """Ve vlákně na pozadí periodicky vzorkuje zásobník zadaného vlákna a počítá stejné zásobníky."""
+
+    def __init__(self, thread_id, interval=None):
+        self.thread_id = thread_id
+        self.interval = interval or PROFILE_SAMPLE_INTERVAL
+        self.stacks = Counter()
+        self._stopped = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_fold_stack(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self.stacks
+
+def store_profile(profiles, label, stacks):
+    with profile_lock:
+        profile_id = next(profile_ids)
+        profiles.append({
+            "id": profile_id,
+            "label": label,
+            "created_at": datetime.now().isoformat(),
+            "stacks": stacks
+        })
+    return profile_id
+
+@contextmanager
+def timed_span(name):
+    """Změří dobu běhu bloku a připočte ji do souhrnných statistik span_stats."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        with profile_lock:
+            stats = span_stats.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            stats["count"] += 1
+            stats["total"] += duration
+            stats["max"] = max(stats["max"], duration)
+
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        with timed_span("json.dumps"):
+            return super().dumps(obj, **kwargs)
+
+app.json = TimedJSONProvider(app)
+
+def profiling_disabled():
+    return not (PROFILE_REQUESTS or PROFILE_SCHEDULER)
+
+@app.route("/api/profiles", methods=['GET'])
+def list_profiles():
+    if profiling_disabled():
+        return jsonify({"error": "Profilování není zapnuto"}), 404
+
+    def describe(profiles):
+        return [
+            {"id": p["id"], "label": p["label"], "created_at": p["created_at"], "samples": sum(p["stacks"].values())}
+            for p in profiles
+        ]
+
+    # jsonify až mimo zámek, serializace JSON sama zapisuje do span_stats
+    with profile_lock:
+        listing = {
+            "requests": describe(request_profiles),
+            "scheduler": describe(scheduler_profiles),
+            "spans": {
+                name: {**stats, "avg": stats["total"] / stats["count"]}
+                for name, stats in span_stats.items()
+            }
+        }
+    return jsonify(listing)
+
+@app.route("/api/profiles/download", methods=['GET'])
+def download_profiles():
+    """Vrátí nasbírané profily ve formátu folded stacks (flamegraph.pl, speedscope)."""
+    if profiling_disabled():
+        return jsonify({"error": "Profilování není zapnuto"}), 404
+    source = request.args.get('source', 'requests')
+    profile_id = request.args.get('id', type=int)
+    if source not in ('requests', 'scheduler'):
+        return jsonify({"error": "Neznámý zdroj profilu"}), 400
+
+    merged = Counter()
+    with profile_lock:
+        profiles = request_profiles if source == 'requests' else scheduler_profiles
+        for profile in profiles:
+            if profile_id is None or profile["id"] == profile_id:
+                for stack, samples in profile["stacks"].items():
+                    merged[f"{profile['label']};{stack}"] += samples
+
+    folded = ''.join(f"{stack} {samples}\n" for stack, samples in merged.most_common())
+    return send_file(io.BytesIO(folded.encode()), mimetype='text/plain', as_attachment=True,
+                     download_name=f"{source}.folded")
+
 @app.route("/api/logs/download")
 def download_logs():
     return send_file("app.log", as_attachment=True)
@@ -88,12 +223,18 @@ def download_logs():
 @app.before_request
 def log_request():
     g.start_time = time.time()
+    if PROFILE_REQUESTS and (request.headers.get('X-Profile') == '1' or request.args.get('profile') == '1'):
+        g.sampler = StackSampler(get_ident()).start()
     request_data = request.get_json(silent=True)
     logger.info(f"[REQUEST] {request.method} {request.path} | Args: {dict(request.args)} | JSON: {request_data}")
 
 @app.after_request
 def log_response(response):
     duration = time.time() - g.start_time
+    sampler = g.pop('sampler', None)
+    if sampler is not None:
+        profile_id = store_profile(request_profiles, f"{request.method} {request.path}", sampler.stop())
+        response.headers['X-Profile-Id'] = str(profile_id)
     try:
         response_data = response.get_json()
     except Exception:
@@ -101,8 +242,17 @@ def log_response(response):
     logger.info(f"[RESPONSE] {request.method} {request.path} | Status: {response.status_code} | Time: {duration:.3f}s | Response: {response_data}")
     return response
 
+@app.teardown_request
+def stop_request_sampler(exc):
+    # Pokud after_request neproběhl, sampler se zastaví zde, aby vlákno nezůstalo běžet
+    sampler = g.pop('sampler', None)
+    if sampler is not None:
+        sampler.stop()
+
 
 global_stock_cache = {}
+ticker_refreshed_at = {}
+ticker_access_counts = {}
 cache_lock = Lock()
 
 def declined_last_3_days(prices):
@@ -127,6 +277,7 @@ def more_than_two_declines_in_last_5_days(prices):
 def get_stock_entry(ticker, use_cache_only=False, force_refresh=False):
     with cache_lock:
         if ticker in global_stock_cache and not force_refresh:
+            ticker_access_counts[ticker] = ticker_access_counts.get(ticker, 0) + 1
             return global_stock_cache[ticker]
         elif use_cache_only:
             return {"error": f"Data pro {ticker} nejsou v cache."}
@@ -134,13 +285,15 @@ def get_stock_entry(ticker, use_cache_only=False, force_refresh=False):
     try:
         end_date = datetime.today()
         start_date = end_date - timedelta(days=10)
-        historical_prices = client.get_dataframe(ticker, startDate=start_date.strftime('%Y-%m-%d'), endDate=end_date.strftime('%Y-%m-%d'))
+        with timed_span("tiingo.get_dataframe"):
+            historical_prices = client.get_dataframe(ticker, startDate=start_date.strftime('%Y-%m-%d'), endDate=end_date.strftime('%Y-%m-%d'))
 
         if historical_prices.empty or len(historical_prices) < 5:
             return {"error": f"Nedostatek dat pro {ticker}"}
 
-        latest_data = historical_prices.sort_index(ascending=False).head(6)
-        prices = [{"date": date.strftime('%Y-%m-%d'), "close": row['close']} for date, row in latest_data.iterrows()]
+        with timed_span("get_stock_entry.to_dict"):
+            latest_data = historical_prices.sort_index(ascending=False).head(6)
+            prices = [{"date": date.strftime('%Y-%m-%d'), "close": row['close']} for date, row in latest_data.iterrows()]
 
         result_entry = {
             "company_name": TICKER_NAMES.get(ticker, 'Neznámá společnost'),
@@ -151,7 +304,12 @@ def get_stock_entry(ticker, use_cache_only=False, force_refresh=False):
         }
 
         with cache_lock:
-            global_stock_cache[ticker] = result_entry
+            # Obnova na pozadí nevrací do cache ticker, který byl mezitím odebrán
+            if not force_refresh or ticker in global_stock_cache:
+                global_stock_cache[ticker] = result_entry
+                ticker_refreshed_at[ticker] = datetime.now(pytz.utc)
+                if not force_refresh:
+                    ticker_access_counts[ticker] = ticker_access_counts.get(ticker, 0) + 1
 
         return result_entry
 
@@ -163,19 +321,127 @@ def get_stock_entry(ticker, use_cache_only=False, force_refresh=False):
         logger.error(f"Chyba při načítání {ticker}: {e}")
         return {"error": "Nastala chyba při získávání dat."}
 
-def scheduled_stock_fetch():
-    logger.info("Spouštím aktualizaci tickerů v cache...")
+MARKET_TZ = pytz.timezone('America/New_York')
+MARKET_CLOSE_HOUR = 16
+REFRESH_DELAY = timedelta(minutes=30)
+REFRESH_WINDOW = timedelta(hours=3)
+REFRESH_INTERVAL_MINUTES = 15
+REFRESH_RETRY_GAP = timedelta(minutes=10)
+
+def _observed_holiday(day):
+    """Svátek připadající na sobotu se na burze slaví v pátek, na neděli v pondělí."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+def _nth_weekday(year, month, weekday, n):
+    """Vrátí n-tý daný den v týdnu v měsíci, n=-1 znamená poslední."""
+    if n > 0:
+        first = datetime(year, month, 1).date()
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    next_month = datetime(year + month // 12, month % 12 + 1, 1).date()
+    last = next_month - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def market_holidays(year):
+    """Vrátí množinu dní, kdy je burza NYSE v daném roce zavřená kvůli svátku."""
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),  # Presidents' Day
+        easter(year) - timedelta(days=2),  # Velký pátek
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _observed_holiday(datetime(year, 7, 4).date()),  # Independence Day
+        _nth_weekday(year, 9, 0, 1),  # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _observed_holiday(datetime(year, 12, 25).date())
+    }
+    new_year = datetime(year, 1, 1).date()
+    # Nový rok připadající na sobotu se neslaví v pátek předchozího roku
+    if new_year.weekday() != 5:
+        holidays.add(_observed_holiday(new_year))
+    if year >= 2022:
+        holidays.add(_observed_holiday(datetime(year, 6, 19).date()))  # Juneteenth
+    return holidays
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in market_holidays(day.year)
+
+def last_market_close(now):
+    """Vrátí čas posledního uzavření burzy, které nastalo nejpozději v čase now."""
+    day = now.astimezone(MARKET_TZ).date()
+    while True:
+        if is_trading_day(day):
+            close = MARKET_TZ.localize(datetime(day.year, day.month, day.day, MARKET_CLOSE_HOUR))
+            if close <= now:
+                return close
+        day -= timedelta(days=1)
+
+def due_tickers(now, last_close):
+    """
+    Vrátí tickery, pro které mohou existovat nová data, seřazené podle priority.
+    Aktuální je jen ticker, jehož historie už obsahuje poslední obchodní den. Dříve obnovené tickery
+    se znovu zkoušejí až REFRESH_DELAY po uzavření trhu a nejdříve REFRESH_RETRY_GAP po posledním
+    pokusu; po konci okna REFRESH_WINDOW se ticker zkoušený v okně nechá do dalšího uzavření.
+    Přednost mají nejdéle neobnovené a nejčastěji používané tickery.
+    """
+    session_date = last_close.strftime('%Y-%m-%d')
+    data_ready = last_close + REFRESH_DELAY
+    window_end = data_ready + REFRESH_WINDOW
+    due = []
     with cache_lock:
-        tickers_to_update = list(global_stock_cache.keys())
+        for ticker, entry in global_stock_cache.items():
+            history = entry.get('history') or []
+            if history and max(price['date'] for price in history) >= session_date:
+                continue
+            refreshed_at = ticker_refreshed_at.get(ticker)
+            if refreshed_at is not None:
+                if now < data_ready or now - refreshed_at < REFRESH_RETRY_GAP:
+                    continue
+                if now >= window_end and refreshed_at >= data_ready:
+                    continue
+            staleness = (now - refreshed_at).total_seconds() if refreshed_at else math.inf
+            accesses = ticker_access_counts.get(ticker, 0)
+            due.append((staleness * (1 + accesses), accesses, ticker))
+    due.sort(reverse=True)
+    return [ticker for _, _, ticker in due]
+
+def scheduled_stock_fetch(now=None):
+    """
+    Obnoví zastaralé tickery v cache. Dávka se volí tak, aby se obnova rovnoměrně rozložila
+    do okna REFRESH_WINDOW po uzavření trhu; po konci okna se doženou všechny zbývající tickery.
+    """
+    now = now or datetime.now(MARKET_TZ)
+    last_close = last_market_close(now)
+    tickers_due = due_tickers(now, last_close)
+    if not tickers_due:
+        logger.info("[REFRESH] Žádný ticker nepotřebuje aktualizaci, přeskakuji.")
+        return
+
+    window_end = last_close + REFRESH_DELAY + REFRESH_WINDOW
+    remaining_runs = max(1, math.ceil((window_end - now) / timedelta(minutes=REFRESH_INTERVAL_MINUTES)))
+    tickers_to_update = tickers_due[:math.ceil(len(tickers_due) / remaining_runs)]
+    logger.info(f"Spouštím aktualizaci tickerů v cache... ({len(tickers_to_update)} z {len(tickers_due)})")
 
     for ticker in tickers_to_update:
         try:
             updated_entry = get_stock_entry(ticker, force_refresh=True)
+            if "error" in updated_entry:
+                # Chybou se nepřepisují platná data, ticker se zkusí znovu podle času pokusu
+                logger.warning(f"Chyba při aktualizaci {ticker}: {updated_entry['error']}")
+                continue
             with cache_lock:
-                global_stock_cache[ticker] = updated_entry
+                if ticker in global_stock_cache:
+                    global_stock_cache[ticker] = updated_entry
             logger.info(f"[REFRESH] Načítám znovu data pro {ticker}")
         except Exception as e:
             logger.warning(f"Chyba při aktualizaci {ticker}: {e}")
+        finally:
+            # Ticker odebraný během obnovy se do cache ani do evidence obnov nevrací
+            with cache_lock:
+                if ticker in global_stock_cache:
+                    ticker_refreshed_at[ticker] = now
 
 
 @app.route('/api/stocks', methods=['GET'])
@@ -209,6 +475,8 @@ def remove_ticker():
     with cache_lock:
         if ticker in global_stock_cache:
             del global_stock_cache[ticker]
+            ticker_refreshed_at.pop(ticker, None)
+            ticker_access_counts.pop(ticker, None)
             return jsonify({"removed": ticker}), 200
         else:
             return jsonify({"error": "Ticker nebyl nalezen v cache"}), 404
@@ -216,6 +484,93 @@ def remove_ticker():
 
 
 
+WATCHLIST_FORMAT_VERSION = 1
+
+@app.route('/api/stocks/export', methods=['GET'])
+def export_watchlist():
+    """
+    Exportuje watchlist i s historií do sloupcového souboru .npz. Historie všech tickerů jsou
+    zploštěné do společných polí history_dates/history_close, hranice určuje history_offsets.
+    """
+    with cache_lock:
+        entries = [(ticker, entry) for ticker, entry in global_stock_cache.items() if "error" not in entry]
+
+    tickers, company_names, offsets, dates, closes = [], [], [0], [], []
+    for ticker, entry in entries:
+        history = entry.get("history") or []
+        tickers.append(ticker)
+        company_names.append(entry.get("company_name", ""))
+        dates.extend(price["date"] for price in history)
+        closes.extend(price["close"] for price in history)
+        offsets.append(len(dates))
+
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        format_version=np.array(WATCHLIST_FORMAT_VERSION),
+        tickers=np.array(tickers, dtype=str),
+        company_names=np.array(company_names, dtype=str),
+        history_offsets=np.array(offsets, dtype=np.int64),
+        history_dates=np.array(dates, dtype='datetime64[D]'),
+        history_close=np.array(closes, dtype=np.float64)
+    )
+    buffer.seek(0)
+    logger.info(f"[EXPORT] Exportováno tickerů: {len(tickers)}")
+    return send_file(buffer, mimetype='application/octet-stream', as_attachment=True, download_name='watchlist.npz')
+
+@app.route('/api/stocks/import', methods=['POST'])
+def import_watchlist():
+    """Načte watchlist ze souboru vytvořeného /api/stocks/export a sloučí ho do cache bez volání Tiingo."""
+    upload = request.files.get('file')
+    stream = upload.stream if upload else io.BytesIO(request.get_data())
+    try:
+        with np.load(stream, allow_pickle=False) as archive:
+            if int(archive["format_version"]) != WATCHLIST_FORMAT_VERSION:
+                raise ValueError("Nepodporovaná verze formátu")
+            if archive["tickers"].dtype.kind != 'U' or archive["company_names"].dtype.kind != 'U':
+                raise ValueError("Tickery a názvy společností musí být textové")
+            if archive["history_offsets"].dtype.kind not in 'iu' or archive["history_close"].dtype.kind not in 'iuf':
+                raise ValueError("history_offsets a history_close musí být číselné")
+            tickers = archive["tickers"].tolist()
+            company_names = archive["company_names"].tolist()
+            offsets = archive["history_offsets"].tolist()
+            dates = np.datetime_as_string(archive["history_dates"], unit='D').tolist()
+            closes = archive["history_close"].tolist()
+        if len(company_names) != len(tickers) or len(offsets) != len(tickers) + 1 or len(dates) != len(closes):
+            raise ValueError("Nekonzistentní délky polí")
+        if any(not ticker.strip() for ticker in tickers):
+            raise ValueError("Prázdný ticker")
+        if offsets[0] != 0 or offsets[-1] != len(dates) or any(a > b for a, b in zip(offsets, offsets[1:])):
+            raise ValueError("Neplatné history_offsets")
+    except Exception as e:
+        logger.warning(f"[IMPORT] Neplatný soubor watchlistu: {e}")
+        return jsonify({"error": "Neplatný soubor watchlistu"}), 400
+
+    imported = {}
+    for i, ticker in enumerate(tickers):
+        start, end = offsets[i], offsets[i + 1]
+        prices = [{"date": date, "close": close} for date, close in zip(dates[start:end], closes[start:end])]
+        if not prices:
+            continue
+        prices.sort(key=lambda x: x['date'], reverse=True)
+        imported[ticker.upper()] = {
+            "company_name": company_names[i],
+            "declined_last_3_days": declined_last_3_days(prices),
+            "more_than_2_declines_last_5_days": more_than_two_declines_in_last_5_days(prices),
+            "latest_close": float(prices[0]['close']),
+            "history": prices
+        }
+
+    with cache_lock:
+        global_stock_cache.update(imported)
+        # Importovaná historie může být starší než poslední obnova, plánovač ji má posoudit znovu
+        for ticker in imported:
+            ticker_refreshed_at.pop(ticker, None)
+        total = len(global_stock_cache)
+    logger.info(f"[IMPORT] Importováno tickerů: {len(imported)}")
+    return jsonify({"imported": len(imported), "total": total})
+
+
 @app.route('/api/stocks/recommend', methods=['POST'])
 def send_recommendations():
     with cache_lock:
@@ -238,6 +593,60 @@ def send_recommendations():
     })
 
 
+NEWS_CACHE_TTL = 300
+NEWS_CACHE_MAX_BYTES = 20 * 1024 * 1024
+
+news_feed_cache = {}
+news_cache_lock = Lock()
+
+def fetch_news_feed(api_url, force_refresh=False):
+    """
+    Vrátí rozparsovaný feed zpráv z api_url. Dokud neuplyne NEWS_CACHE_TTL, vrací se feed z cache
+    bez síťového požadavku. Poté (nebo při force_refresh) se feed revaliduje přes ETag/Last-Modified
+    a odpověď 304 jen obnoví platnost záznamu. Při chybě stahování vrací None.
+    """
+    with news_cache_lock:
+        cached = news_feed_cache.get(api_url)
+    now = time.time()
+    if cached and not force_refresh and now - cached['fetched_at'] < NEWS_CACHE_TTL:
+        logger.info(f"[NEWS] Feed z cache: {api_url}")
+        return cached['data']
+
+    headers = {}
+    if cached:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    response = requests.get(api_url, headers=headers)
+    logger.info(f"[NEWS] {response}")
+    if response.status_code == 304 and cached:
+        with news_cache_lock:
+            cached['fetched_at'] = now
+        return cached['data']
+    if response.status_code != 200:
+        return None
+
+    data = response.json()
+    size = len(response.content)
+    if size <= NEWS_CACHE_MAX_BYTES:
+        with news_cache_lock:
+            news_feed_cache[api_url] = {
+                'data': data,
+                'fetched_at': now,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'size': size
+            }
+            # Nejdéle nestahované feedy se vyřadí, dokud cache nepřesahuje rozpočet
+            total_size = sum(entry['size'] for entry in news_feed_cache.values())
+            while total_size > NEWS_CACHE_MAX_BYTES:
+                oldest_url = min(news_feed_cache, key=lambda url: news_feed_cache[url]['fetched_at'])
+                total_size -= news_feed_cache.pop(oldest_url)['size']
+    return data
+
+
 @app.route('/api/news', methods=['POST'])
 def fetch_and_filter_news():
     try:
@@ -248,14 +657,11 @@ def fetch_and_filter_news():
         if not api_url:
             return jsonify({'error': 'Chybí api_url'}), 400
 
-        # Načtení zpráv z externího API
-        response = requests.get(api_url)
-        logger.info(f"[NEWS] {response}")
-        if response.status_code != 200:
+        # Načtení zpráv z externího API (nebo z cache)
+        all_news = fetch_news_feed(api_url, force_refresh=body.get('force_refresh', False))
+        if all_news is None:
             return jsonify({'error': 'Nepodařilo se stáhnout data ze zadané adresy'}), 500
 
-        all_news = response.json()
-
         # Filtrování a označování
         filtered = []
         for item in all_news:
@@ -279,6 +685,108 @@ def fetch_and_filter_news():
         return jsonify({'error': 'Došlo k chybě při zpracování'}), 500
 
 
+NEWS_HALF_LIFE_DAYS = 3
+
+def parse_news_date(value):
+    """Převede datum zprávy (ISO 8601) na datetime bez časové zóny v UTC, neplatné datum vrací None."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def aggregate_news(items, min_count=1, min_rating=0, window_days=None, half_life_days=NEWS_HALF_LIFE_DAYS, now=None):
+    """
+    Jedním průchodem seskupí zprávy podle tickeru (klíč 'name') a spočítá počet zpráv,
+    průměrné hodnocení, hodnocení vážené stářím zprávy a datum nejnovější zprávy.
+    Drží pouze průběžné součty pro každý ticker, paměť tedy roste s počtem tickerů, ne zpráv.
+    Odfiltruje tickery s méně než min_count zprávami a s váženým hodnocením pod min_rating.
+    """
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    since = now - timedelta(days=window_days) if window_days else None
+
+    stats = {}
+    for item in items:
+        name = item.get('name')
+        rating = item.get('rating')
+        if not name or rating is None:
+            continue
+
+        published = parse_news_date(item.get('date'))
+        if since is not None and (published is None or published < since):
+            continue
+
+        if published is not None:
+            age_days = max((now - published).total_seconds(), 0) / 86400
+            weight = 0.5 ** (age_days / half_life_days)
+        else:
+            weight = 1.0
+
+        entry = stats.get(name)
+        if entry is None:
+            entry = stats[name] = {'count': 0, 'rating_sum': 0.0, 'weighted_sum': 0.0, 'weight_sum': 0.0, 'latest': None}
+        entry['count'] += 1
+        entry['rating_sum'] += rating
+        entry['weighted_sum'] += rating * weight
+        entry['weight_sum'] += weight
+        if published is not None and (entry['latest'] is None or published > entry['latest']):
+            entry['latest'] = published
+
+    aggregated = []
+    for name, entry in stats.items():
+        if entry['count'] < min_count:
+            continue
+        avg_rating = entry['rating_sum'] / entry['count']
+        # U velmi starých zpráv váha podteče na 0, pak se použije prostý průměr
+        weighted_rating = entry['weighted_sum'] / entry['weight_sum'] if entry['weight_sum'] > 0 else avg_rating
+        if weighted_rating < min_rating:
+            continue
+        aggregated.append({
+            'name': name,
+            'count': entry['count'],
+            'avg_rating': avg_rating,
+            'weighted_rating': weighted_rating,
+            'latest_date': entry['latest'].strftime('%Y-%m-%d') if entry['latest'] else None
+        })
+    return aggregated
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+@app.route('/api/news/aggregate', methods=['POST'])
+def aggregate_and_filter_news():
+    try:
+        body = request.get_json()
+        api_url = body.get('api_url')
+        min_count = body.get('min_count', 1)
+        min_rating = body.get('min_rating', 0)
+        window_days = body.get('window_days')
+
+        if not api_url:
+            return jsonify({'error': 'Chybí api_url'}), 400
+        if not is_number(min_count) or not is_number(min_rating) or \
+                (window_days is not None and (not is_number(window_days) or window_days < 0)):
+            return jsonify({'error': 'Neplatné parametry agregace'}), 400
+
+        all_news = fetch_news_feed(api_url, force_refresh=body.get('force_refresh', False))
+        if all_news is None:
+            return jsonify({'error': 'Nepodařilo se stáhnout data ze zadané adresy'}), 500
+
+        aggregated = aggregate_news(all_news, min_count=min_count, min_rating=min_rating, window_days=window_days)
+        logger.info(f"[NEWS] Agregace zpráv z: {api_url} | Min. počet: {min_count} | Min. hodnocení: {min_rating} | Okno: {window_days}")
+        logger.info(f"[NEWS] Po agregaci ponecháno tickerů: {len(aggregated)}")
+        return jsonify({'data': aggregated})
+
+    except Exception as e:
+        logger.error(f"Chyba při agregaci zpráv: {e}")
+        return jsonify({'error': 'Došlo k chybě při zpracování'}), 500
+
+
 
 @app.route('/api/hello', methods=['GET'])
 def hello_world():
@@ -289,10 +797,22 @@ def handle_exception(e):
     logger.error(f"Nezachycená výjimka: {e}")
     return jsonify(error=str(e)), 500
 
+def profiled_stock_fetch():
+    """Spustí plánovanou aktualizaci, s PROFILE_SCHEDULER=1 vzorkuje vlákno plánovače do průběžných profilů."""
+    if not PROFILE_SCHEDULER:
+        return scheduled_stock_fetch()
+    sampler = StackSampler(get_ident()).start()
+    try:
+        scheduled_stock_fetch()
+    finally:
+        stacks = sampler.stop()
+        if stacks:
+            store_profile(scheduler_profiles, "scheduler", stacks)
+
 # Scheduler pro obnoveni dat
 scheduler = BackgroundScheduler()
-trigger = CronTrigger(hour='0,6,12,18', minute=0)
-scheduler.add_job(func=scheduled_stock_fetch, trigger=trigger)
+trigger = IntervalTrigger(minutes=REFRESH_INTERVAL_MINUTES)
+scheduler.add_job(func=profiled_stock_fetch, trigger=trigger)
 scheduler.start()
 atexit.register(lambda: scheduler.shutdown())
 
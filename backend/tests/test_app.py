@@ -3,14 +3,19 @@ import pytest
 import requests
 from datetime import datetime, timedelta
 from threading import Thread
+import numpy as np
 import pandas as pd
 import tempfile
+import io
 import logging
 import os
+import time
 
 # Importujeme aplikaci a sdílené proměnné/funkce
 from backend.app import app, global_stock_cache, get_stock_entry, scheduled_stock_fetch, cache_lock, \
-    declined_last_3_days, more_than_two_declines_in_last_5_days
+    declined_last_3_days, more_than_two_declines_in_last_5_days, aggregate_news, news_feed_cache, news_cache_lock, \
+    ticker_refreshed_at, ticker_access_counts, market_holidays, last_market_close, MARKET_TZ, StackSampler, \
+    profiled_stock_fetch, scheduler_profiles
 
 # Vzorová data, která vrací naše náhradní (fake) funkce
 FAKE_STOCK_DATA = {
@@ -30,9 +35,17 @@ def clear_cache():
     """Vyčistí globální cache před a po každém testu."""
     with cache_lock:
         global_stock_cache.clear()
+        ticker_refreshed_at.clear()
+        ticker_access_counts.clear()
+    with news_cache_lock:
+        news_feed_cache.clear()
     yield
     with cache_lock:
         global_stock_cache.clear()
+        ticker_refreshed_at.clear()
+        ticker_access_counts.clear()
+    with news_cache_lock:
+        news_feed_cache.clear()
 
 
 @pytest.fixture
@@ -84,9 +97,11 @@ def fake_get_stock_entry_error(ticker, use_cache_only=False, force_refresh=False
 
 
 class FakeResponse:
-    def __init__(self, json_data, status_code):
+    def __init__(self, json_data, status_code, headers=None):
         self._json = json_data
         self.status_code = status_code
+        self.headers = headers or {}
+        self.content = json.dumps(json_data).encode()
 
     def json(self):
         return self._json
@@ -148,6 +163,108 @@ def test_remove_ticker_success(client):
     assert "error" in data
 
 
+def test_watchlist_export_import_roundtrip(client):
+    """Export watchlistu do .npz a jeho import obnoví cache včetně historie."""
+    with cache_lock:
+        global_stock_cache["AAPL"] = FAKE_STOCK_DATA.copy()
+        global_stock_cache["MSFT"] = {**FAKE_STOCK_DATA, "company_name": "Microsoft Corporation"}
+        global_stock_cache["BAD"] = {"error": "Nedostatek dat pro BAD"}
+
+    export = client.get('/api/stocks/export')
+    assert export.status_code == 200
+    assert export.headers["Content-Disposition"].startswith("attachment")
+    payload = export.get_data()
+
+    with cache_lock:
+        global_stock_cache.clear()
+    response = client.post('/api/stocks/import', data={"file": (io.BytesIO(payload), "watchlist.npz")},
+                           content_type="multipart/form-data")
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data == {"imported": 2, "total": 2}
+    with cache_lock:
+        assert global_stock_cache["AAPL"]["history"] == FAKE_STOCK_DATA["history"]
+        assert global_stock_cache["AAPL"]["latest_close"] == FAKE_STOCK_DATA["latest_close"]
+        # Příznaky poklesů se přepočítají z importované historie
+        assert global_stock_cache["AAPL"]["declined_last_3_days"] == declined_last_3_days(FAKE_STOCK_DATA["history"])
+        assert global_stock_cache["MSFT"]["company_name"] == "Microsoft Corporation"
+        assert "BAD" not in global_stock_cache
+
+
+def test_watchlist_import_raw_body(client):
+    """Import přijme soubor i přímo v těle požadavku."""
+    with cache_lock:
+        global_stock_cache["TSLA"] = FAKE_STOCK_DATA.copy()
+    payload = client.get('/api/stocks/export').get_data()
+    with cache_lock:
+        global_stock_cache.clear()
+
+    response = client.post('/api/stocks/import', data=payload, content_type="application/octet-stream")
+    assert response.status_code == 200
+    assert "TSLA" in global_stock_cache
+
+
+def test_watchlist_import_clears_refresh_time(client):
+    """Import zapomene čas poslední obnovy, aby plánovač posoudil importovanou historii."""
+    with cache_lock:
+        global_stock_cache["TSLA"] = FAKE_STOCK_DATA.copy()
+    payload = client.get('/api/stocks/export').get_data()
+    with cache_lock:
+        ticker_refreshed_at["TSLA"] = MARKET_TZ.localize(datetime(2025, 5, 16, 17))
+
+    client.post('/api/stocks/import', data=payload, content_type="application/octet-stream")
+    assert "TSLA" not in ticker_refreshed_at
+
+
+def test_watchlist_import_invalid_offsets(client):
+    """Soubor s neplatnými history_offsets se odmítne, místo aby se tickery tiše vynechaly."""
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        format_version=np.array(1),
+        tickers=np.array(["AAPL", "MSFT"]),
+        company_names=np.array(["Apple Inc.", "Microsoft Corporation"]),
+        history_offsets=np.array([0, 2, 1], dtype=np.int64),
+        history_dates=np.array(["2025-05-13", "2025-05-12"], dtype='datetime64[D]'),
+        history_close=np.array([150.0, 149.0])
+    )
+    response = client.post('/api/stocks/import', data=buffer.getvalue(), content_type="application/octet-stream")
+    assert response.status_code == 400
+    assert global_stock_cache == {}
+
+
+@pytest.mark.parametrize("overrides", [
+    {"tickers": np.array([1, 2])},
+    {"tickers": np.array(["AAPL", " "])},
+    {"history_close": np.array(["150.0", "149.0"])}
+])
+def test_watchlist_import_invalid_types(client, overrides):
+    """Soubor s nečíselnými cenami, netextovými nebo prázdnými tickery se odmítne s chybou klienta."""
+    arrays = {
+        "format_version": np.array(1),
+        "tickers": np.array(["AAPL", "MSFT"]),
+        "company_names": np.array(["Apple Inc.", "Microsoft Corporation"]),
+        "history_offsets": np.array([0, 1, 2], dtype=np.int64),
+        "history_dates": np.array(["2025-05-13", "2025-05-12"], dtype='datetime64[D]'),
+        "history_close": np.array([150.0, 149.0]),
+        **overrides
+    }
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    response = client.post('/api/stocks/import', data=buffer.getvalue(), content_type="application/octet-stream")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Neplatný soubor watchlistu"
+    assert global_stock_cache == {}
+
+
+def test_watchlist_import_invalid_file(client):
+    """Neplatný soubor vrátí error a cache zůstane beze změny."""
+    response = client.post('/api/stocks/import', data=b"not a watchlist", content_type="application/octet-stream")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+    assert global_stock_cache == {}
+
+
 def test_send_recommendations_success(client, monkeypatch):
     """Test endpointu /api/stocks/recommend při úspěšném odeslání."""
     with cache_lock:
@@ -188,7 +305,7 @@ def test_fetch_and_filter_news_success(client, monkeypatch):
         {"name": "News3", "date": "2025-05-10", "rating": 8}
     ]
 
-    def fake_requests_get(url):
+    def fake_requests_get(url, headers=None):
         return FakeResponse(fake_news, 200)
 
     monkeypatch.setattr(requests, "get", fake_requests_get)
@@ -204,6 +321,138 @@ def test_fetch_and_filter_news_success(client, monkeypatch):
             assert item["sell"] == 0
 
 
+def test_aggregate_news_filters():
+    """Agregace podle tickeru odfiltruje tickery s malým počtem zpráv a záporným hodnocením."""
+    news = [
+        {"name": "AAPL", "date": "2025-05-12", "rating": 6},
+        {"name": "AAPL", "date": "2025-05-10", "rating": 2},
+        {"name": "MSFT", "date": "2025-05-12", "rating": -5},
+        {"name": "MSFT", "date": "2025-05-11", "rating": -1},
+        {"name": "TSLA", "date": "2025-05-12", "rating": 9},
+        {"name": "NVDA", "date": "2025-05-12"}
+    ]
+    result = aggregate_news(news, min_count=2, min_rating=0, now=datetime(2025, 5, 12))
+    assert [item["name"] for item in result] == ["AAPL"]
+    aapl = result[0]
+    assert aapl["count"] == 2
+    assert aapl["avg_rating"] == 4
+    # Novější zpráva má větší váhu
+    assert aapl["weighted_rating"] > aapl["avg_rating"]
+    assert aapl["latest_date"] == "2025-05-12"
+
+
+def test_aggregate_news_window():
+    """Zprávy starší než zadané okno se do agregace nezapočítají."""
+    news = [
+        {"name": "AAPL", "date": "2025-05-12T10:00:00Z", "rating": 3},
+        {"name": "AAPL", "date": "2025-04-01", "rating": -10},
+        {"name": "AAPL", "date": None, "rating": -10}
+    ]
+    result = aggregate_news(news, window_days=7, now=datetime(2025, 5, 13))
+    assert result[0]["count"] == 1
+    assert result[0]["avg_rating"] == 3
+
+
+def test_aggregate_news_very_old_items():
+    """Zprávy tak staré, že jejich váha podteče na 0, nevyvolají dělení nulou."""
+    result = aggregate_news([{"name": "A", "date": "2010-01-01", "rating": 5}], now=datetime(2025, 5, 1))
+    assert result[0]["weighted_rating"] == 5
+    assert result[0]["avg_rating"] == 5
+
+
+def test_aggregate_and_filter_news_endpoint(client, monkeypatch):
+    """Test endpointu /api/news/aggregate s fake news daty."""
+    fake_news = [
+        {"name": "AAPL", "date": "2025-05-12", "rating": 5},
+        {"name": "AAPL", "date": "2025-05-11", "rating": 3},
+        {"name": "MSFT", "date": "2025-05-12", "rating": 8}
+    ]
+
+    def fake_requests_get(url, headers=None):
+        return FakeResponse(fake_news, 200)
+
+    monkeypatch.setattr(requests, "get", fake_requests_get)
+    response = client.post('/api/news/aggregate', json={"api_url": "http://fakeapi/news", "min_count": 2})
+    data = response.get_json()
+    assert response.status_code == 200
+    assert [item["name"] for item in data["data"]] == ["AAPL"]
+    assert data["data"][0]["count"] == 2
+
+
+def test_aggregate_and_filter_news_missing_api_url(client):
+    """Pokud v těle požadavku chybí api_url, vrátí se error."""
+    response = client.post('/api/news/aggregate', json={"min_count": 2})
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+@pytest.mark.parametrize("params", [
+    {"min_count": "2"},
+    {"min_rating": "0"},
+    {"window_days": "7"},
+    {"window_days": -1},
+    {"min_count": True}
+])
+def test_aggregate_and_filter_news_invalid_params(client, monkeypatch, params):
+    """Parametry agregace, které nejsou čísla, vrátí chybu klienta ještě před stažením feedu."""
+    monkeypatch.setattr(requests, "get", lambda url, headers=None: pytest.fail("Feed se nemá stahovat"))
+    response = client.post('/api/news/aggregate', json={"api_url": "http://fakeapi/news", **params})
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Neplatné parametry agregace"
+
+
+def test_fetch_and_filter_news_uses_cache(client, monkeypatch):
+    """Opakovaný dotaz se stejným api_url a jiným prahem se obslouží z cache bez stahování."""
+    calls = []
+
+    def fake_requests_get(url, headers=None):
+        calls.append(headers)
+        return FakeResponse([{"name": "AAPL", "date": "2025-05-12", "rating": 5}], 200)
+
+    monkeypatch.setattr(requests, "get", fake_requests_get)
+    first = client.post('/api/news', json={"api_url": "http://fakeapi/news", "min_rating_for_sell": 4})
+    second = client.post('/api/news', json={"api_url": "http://fakeapi/news", "min_rating_for_sell": 6})
+    assert len(calls) == 1
+    assert first.get_json()["data"][0]["sell"] == 0
+    assert second.get_json()["data"][0]["sell"] == 1
+
+
+def test_fetch_and_filter_news_revalidation(client, monkeypatch):
+    """Po vypršení TTL se feed revaliduje přes ETag a odpověď 304 vrátí data z cache."""
+    fake_news = [{"name": "AAPL", "date": "2025-05-12", "rating": 5}]
+    calls = []
+
+    def fake_requests_get(url, headers=None):
+        calls.append(headers)
+        if headers and headers.get("If-None-Match") == '"v1"':
+            return FakeResponse(None, 304)
+        return FakeResponse(fake_news, 200, headers={"ETag": '"v1"'})
+
+    monkeypatch.setattr(requests, "get", fake_requests_get)
+    client.post('/api/news', json={"api_url": "http://fakeapi/news"})
+    with news_cache_lock:
+        news_feed_cache["http://fakeapi/news"]["fetched_at"] -= 3600
+
+    response = client.post('/api/news', json={"api_url": "http://fakeapi/news"})
+    assert response.status_code == 200
+    assert response.get_json()["data"][0]["name"] == "AAPL"
+    assert calls == [{}, {"If-None-Match": '"v1"'}]
+
+
+def test_news_cache_size_budget(client, monkeypatch):
+    """Feedy přesahující rozpočet cache se vyřadí, nejstarší jako první."""
+    def fake_requests_get(url, headers=None):
+        return FakeResponse([{"name": url, "date": "2025-05-12", "rating": 5}], 200)
+
+    monkeypatch.setattr(requests, "get", fake_requests_get)
+    entry_size = len(FakeResponse([{"name": "http://fakeapi/a", "date": "2025-05-12", "rating": 5}], 200).content)
+    monkeypatch.setattr("backend.app.NEWS_CACHE_MAX_BYTES", entry_size * 2)
+    for url in ["http://fakeapi/a", "http://fakeapi/b", "http://fakeapi/c"]:
+        client.post('/api/news', json={"api_url": url})
+    with news_cache_lock:
+        assert set(news_feed_cache) == {"http://fakeapi/b", "http://fakeapi/c"}
+
+
 def test_fetch_and_filter_news_missing_api_url(client):
     """Pokud v těle požadavku chybí api_url, vrátí se error."""
     response = client.post('/api/news', json={"min_rating_for_sell": 4})
@@ -226,6 +475,171 @@ def test_scheduled_stock_fetch(monkeypatch):
     assert global_stock_cache.get("IBM") == FAKE_STOCK_DATA
 
 
+def test_market_holidays():
+    """Ověří pohyblivé i přesunuté svátky burzy."""
+    holidays_2025 = market_holidays(2025)
+    assert datetime(2025, 4, 18).date() in holidays_2025  # Velký pátek
+    assert datetime(2025, 6, 19).date() in holidays_2025  # Juneteenth
+    assert datetime(2025, 11, 27).date() in holidays_2025  # Thanksgiving
+    assert datetime(2026, 7, 3).date() in market_holidays(2026)  # 4. července připadá na sobotu
+    assert datetime(2021, 12, 31).date() not in market_holidays(2021)
+
+
+def test_last_market_close_skips_weekend_and_holiday():
+    """O víkendu i o svátku je posledním uzavřením předchozí obchodní den."""
+    saturday = MARKET_TZ.localize(datetime(2025, 5, 17, 12))
+    assert last_market_close(saturday) == MARKET_TZ.localize(datetime(2025, 5, 16, 16))
+    good_friday = MARKET_TZ.localize(datetime(2025, 4, 18, 20))
+    assert last_market_close(good_friday) == MARKET_TZ.localize(datetime(2025, 4, 17, 16))
+    before_close = MARKET_TZ.localize(datetime(2025, 5, 13, 15))
+    assert last_market_close(before_close) == MARKET_TZ.localize(datetime(2025, 5, 12, 16))
+
+
+def test_scheduled_stock_fetch_skips_fresh_tickers(monkeypatch):
+    """Ticker s daty za poslední obchodní den ani ticker obnovený po uzavření trhu se znovu nestahuje."""
+    refreshed = []
+
+    def fake_get_stock_entry_for_schedule(ticker, use_cache_only=False, force_refresh=False):
+        refreshed.append(ticker)
+        return FAKE_STOCK_DATA.copy()
+
+    monkeypatch.setattr("backend.app.get_stock_entry", fake_get_stock_entry_for_schedule)
+    with cache_lock:
+        global_stock_cache["AAPL"] = {**FAKE_STOCK_DATA, "history": [{"date": "2025-05-16", "close": 1.0}]}
+        global_stock_cache["MSFT"] = FAKE_STOCK_DATA.copy()
+        ticker_refreshed_at["MSFT"] = MARKET_TZ.localize(datetime(2025, 5, 16, 17))
+        global_stock_cache["TSLA"] = FAKE_STOCK_DATA.copy()
+        ticker_refreshed_at["TSLA"] = MARKET_TZ.localize(datetime(2025, 5, 15, 17))
+
+    scheduled_stock_fetch(now=MARKET_TZ.localize(datetime(2025, 5, 17, 12)))
+    assert refreshed == ["TSLA"]
+
+
+def test_scheduled_stock_fetch_waits_for_close_data(monkeypatch):
+    """Před zveřejněním dat po uzavření trhu se již obnovené tickery neaktualizují."""
+    refreshed = []
+    monkeypatch.setattr("backend.app.get_stock_entry",
+                        lambda ticker, use_cache_only=False, force_refresh=False: refreshed.append(ticker) or {})
+    with cache_lock:
+        global_stock_cache["TSLA"] = FAKE_STOCK_DATA.copy()
+        ticker_refreshed_at["TSLA"] = MARKET_TZ.localize(datetime(2025, 5, 15, 17))
+
+    scheduled_stock_fetch(now=MARKET_TZ.localize(datetime(2025, 5, 16, 16, 10)))
+    assert refreshed == []
+
+
+def test_scheduled_stock_fetch_spreads_load(monkeypatch):
+    """Na začátku okna se obnoví jen část tickerů, nejdříve ty nejpoužívanější."""
+    refreshed = []
+
+    def fake_get_stock_entry_for_schedule(ticker, use_cache_only=False, force_refresh=False):
+        refreshed.append(ticker)
+        return FAKE_STOCK_DATA.copy()
+
+    monkeypatch.setattr("backend.app.get_stock_entry", fake_get_stock_entry_for_schedule)
+    with cache_lock:
+        for i in range(20):
+            global_stock_cache[f"T{i}"] = FAKE_STOCK_DATA.copy()
+            ticker_refreshed_at[f"T{i}"] = MARKET_TZ.localize(datetime(2025, 5, 15, 17))
+        ticker_access_counts["T7"] = 10
+
+    scheduled_stock_fetch(now=MARKET_TZ.localize(datetime(2025, 5, 16, 16, 30)))
+    # Okno 3 hodiny po 15 minutách = 12 běhů, tedy ceil(20 / 12) = 2 tickery
+    assert len(refreshed) == 2
+    assert refreshed[0] == "T7"
+
+    refreshed.clear()
+    scheduled_stock_fetch(now=MARKET_TZ.localize(datetime(2025, 5, 16, 20)))
+    # Po konci okna se doženou zbývající tickery, ty zkoušené v okně čekají na další uzavření
+    assert len(refreshed) == 18
+    assert "T7" not in refreshed
+
+
+def test_scheduled_stock_fetch_retries_missing_session(monkeypatch):
+    """Když první obnova po uzavření vrátí starou historii, ticker se v okně zkusí znovu."""
+    refreshed = []
+
+    def fake_get_stock_entry_for_schedule(ticker, use_cache_only=False, force_refresh=False):
+        refreshed.append(ticker)
+        return {**FAKE_STOCK_DATA, "history": [{"date": "2025-05-15", "close": 1.0}]}
+
+    monkeypatch.setattr("backend.app.get_stock_entry", fake_get_stock_entry_for_schedule)
+    with cache_lock:
+        global_stock_cache["AAPL"] = {**FAKE_STOCK_DATA, "history": [{"date": "2025-05-15", "close": 1.0}]}
+        ticker_refreshed_at["AAPL"] = MARKET_TZ.localize(datetime(2025, 5, 16, 16, 35))
+
+    # Příliš brzy po posledním pokusu
+    scheduled_stock_fetch(now=MARKET_TZ.localize(datetime(2025, 5, 16, 16, 40)))
+    assert refreshed == []
+    scheduled_stock_fetch(now=MARKET_TZ.localize(datetime(2025, 5, 16, 18)))
+    assert refreshed == ["AAPL"]
+    # Po konci okna se ticker zkoušený v okně nechá do dalšího uzavření
+    scheduled_stock_fetch(now=MARKET_TZ.localize(datetime(2025, 5, 17, 12)))
+    assert refreshed == ["AAPL"]
+
+
+def test_scheduled_stock_fetch_error_keeps_entry(monkeypatch):
+    """Chyba při obnově nepřepíše platná data a ticker se o víkendu znovu nezkouší."""
+    calls = []
+
+    def fake_get_stock_entry_for_schedule(ticker, use_cache_only=False, force_refresh=False):
+        calls.append(ticker)
+        return {"error": "Nastala chyba při získávání dat."}
+
+    monkeypatch.setattr("backend.app.get_stock_entry", fake_get_stock_entry_for_schedule)
+    with cache_lock:
+        global_stock_cache["AAPL"] = FAKE_STOCK_DATA.copy()
+
+    scheduled_stock_fetch(now=MARKET_TZ.localize(datetime(2025, 5, 17, 12)))
+    scheduled_stock_fetch(now=MARKET_TZ.localize(datetime(2025, 5, 17, 12, 15)))
+    assert calls == ["AAPL"]
+    assert global_stock_cache["AAPL"] == FAKE_STOCK_DATA
+
+
+def test_scheduled_stock_fetch_skips_removed_ticker(monkeypatch):
+    """Ticker odebraný během obnovy se do cache ani do evidence obnov nevrátí."""
+    def fake_get_stock_entry_for_schedule(ticker, use_cache_only=False, force_refresh=False):
+        with cache_lock:
+            del global_stock_cache[ticker]
+        return FAKE_STOCK_DATA.copy()
+
+    monkeypatch.setattr("backend.app.get_stock_entry", fake_get_stock_entry_for_schedule)
+    with cache_lock:
+        global_stock_cache["AAPL"] = FAKE_STOCK_DATA.copy()
+
+    scheduled_stock_fetch(now=MARKET_TZ.localize(datetime(2025, 5, 17, 12)))
+    assert "AAPL" not in global_stock_cache
+    assert "AAPL" not in ticker_refreshed_at
+
+
+def test_get_stock_entry_force_refresh_removed_ticker(monkeypatch):
+    """Vynucená obnova tickeru, který není v cache, ho do cache nepřidá."""
+    def fake_get_dataframe(ticker, *args, **kwargs):
+        return pd.DataFrame(
+            {"close": [150.0 - i for i in range(6)]},
+            index=pd.DatetimeIndex([datetime(2025, 5, 13) - timedelta(days=i) for i in range(6)])
+        )
+
+    monkeypatch.setattr("backend.app.client.get_dataframe", fake_get_dataframe)
+    entry = get_stock_entry("AAPL", force_refresh=True)
+    assert "error" not in entry
+    assert "AAPL" not in global_stock_cache
+    assert "AAPL" not in ticker_refreshed_at
+
+
+def test_access_counts_only_for_cached_tickers(client):
+    """Neúspěšné přidání neplatného tickeru nezanechá počet přístupů."""
+    for _ in range(5):
+        response = client.post('/api/stocks/add_and_check', json={"ticker": "INVALID"})
+        assert response.status_code == 400
+    assert ticker_access_counts == {}
+
+    with cache_lock:
+        global_stock_cache["AAPL"] = FAKE_STOCK_DATA.copy()
+    get_stock_entry("AAPL")
+    assert ticker_access_counts == {"AAPL": 1}
+
+
 def test_error_handler(client, monkeypatch):
     """
     Simuluje neodchycenou výjimku v rámci endpointu /api/stocks/add_and_check
@@ -395,7 +809,7 @@ def test_send_recommendations_empty_filtered(client, monkeypatch):
 def test_fetch_and_filter_news_api_failure(client, monkeypatch):
     """Testuje /api/news při selhání externího API."""
 
-    def fake_requests_get(url):
+    def fake_requests_get(url, headers=None):
         return FakeResponse({}, 500)
 
     monkeypatch.setattr(requests, "get", fake_requests_get)
@@ -447,6 +861,94 @@ def test_cache_lock_concurrent_access(monkeypatch, mock_get_stock_entry):
             assert global_stock_cache[f"TEST{i}"] == FAKE_STOCK_DATA
 
 
+def test_stack_sampler_collects_folded_stacks():
+    """Sampler zachytí zásobník sledovaného vlákna včetně volající funkce."""
+    from threading import get_ident
+    sampler = StackSampler(get_ident(), interval=0.001).start()
+    time.sleep(0.05)
+    stacks = sampler.stop()
+    assert sum(stacks.values()) > 0
+    assert any("test_stack_sampler_collects_folded_stacks" in stack for stack in stacks)
+
+
+def test_request_profiling(client, monkeypatch):
+    """Požadavek s ?profile=1 se profiluje a profil lze stáhnout ve formátu folded stacks."""
+    monkeypatch.setattr("backend.app.PROFILE_REQUESTS", True)
+    monkeypatch.setattr("backend.app.PROFILE_SAMPLE_INTERVAL", 0.001)
+
+    def slow_get_stock_entry(ticker, use_cache_only=False, force_refresh=False):
+        time.sleep(0.05)
+        return FAKE_STOCK_DATA.copy()
+
+    monkeypatch.setattr("backend.app.get_stock_entry", slow_get_stock_entry)
+    response = client.post('/api/stocks/add_and_check?profile=1', json={"ticker": "AAPL"})
+    assert response.status_code == 200
+    profile_id = response.headers["X-Profile-Id"]
+
+    listing = client.get('/api/profiles').get_json()
+    assert any(str(p["id"]) == profile_id and p["label"] == "POST /api/stocks/add_and_check"
+               for p in listing["requests"])
+    assert listing["spans"]["json.dumps"]["count"] >= 1
+
+    download = client.get(f'/api/profiles/download?id={profile_id}')
+    assert download.status_code == 200
+    assert download.headers["Content-Disposition"].startswith("attachment")
+    lines = download.get_data(as_text=True).splitlines()
+    assert len(lines) >= 1
+    for line in lines:
+        assert line.startswith("POST /api/stocks/add_and_check;")
+    assert any("slow_get_stock_entry" in line for line in lines)
+
+
+def test_request_without_profile_flag(client, monkeypatch):
+    """Bez příznaku se požadavek neprofiluje."""
+    monkeypatch.setattr("backend.app.PROFILE_REQUESTS", True)
+    response = client.get('/api/hello')
+    assert "X-Profile-Id" not in response.headers
+
+
+def test_request_profiling_disabled(client):
+    """Bez PROFILE_REQUESTS na serveru se příznak klienta ignoruje a profily nejsou dostupné."""
+    response = client.get('/api/hello?profile=1', headers={"X-Profile": "1"})
+    assert "X-Profile-Id" not in response.headers
+    assert client.get('/api/profiles').status_code == 404
+    assert client.get('/api/profiles/download').status_code == 404
+
+
+def test_download_profiles_unknown_source(client, monkeypatch):
+    monkeypatch.setattr("backend.app.PROFILE_REQUESTS", True)
+    response = client.get('/api/profiles/download?source=unknown')
+    assert response.status_code == 400
+
+
+def test_profiled_stock_fetch(monkeypatch):
+    """S PROFILE_SCHEDULER se běh plánovače uloží do profilů plánovače."""
+    monkeypatch.setattr("backend.app.PROFILE_SCHEDULER", True)
+    monkeypatch.setattr("backend.app.scheduled_stock_fetch", lambda: time.sleep(0.05))
+    before = len(scheduler_profiles)
+    profiled_stock_fetch()
+    assert len(scheduler_profiles) == min(before + 1, scheduler_profiles.maxlen)
+    assert scheduler_profiles[-1]["label"] == "scheduler"
+
+
+def test_get_stock_entry_timing_spans(client, monkeypatch):
+    """Volání Tiingo i převod DataFrame na slovníky jsou měřeny vlastními spany."""
+    monkeypatch.setattr("backend.app.PROFILE_REQUESTS", True)
+
+    def fake_get_dataframe(ticker, *args, **kwargs):
+        return pd.DataFrame(
+            {"close": [150.0 - i for i in range(6)]},
+            index=pd.DatetimeIndex([datetime(2025, 5, 13) - timedelta(days=i) for i in range(6)])
+        )
+
+    monkeypatch.setattr("backend.app.client.get_dataframe", fake_get_dataframe)
+    entry = get_stock_entry("AAPL")
+    assert "error" not in entry
+    spans = client.get('/api/profiles').get_json()["spans"]
+    assert spans["tiingo.get_dataframe"]["count"] >= 1
+    assert spans["get_stock_entry.to_dict"]["count"] >= 1
+
+
 def test_api_key_loading(monkeypatch):
     """Testuje načítání API klíče."""
     monkeypatch.setattr("os.getenv", lambda key, default=None: "fake-key" if key == "API_KEY" else default)